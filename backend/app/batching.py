@@ -0,0 +1,127 @@
+import os, time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from .config import CHUNK_SIZE_MB, INGEST_MEM_MB, INGEST_FLUSH_MS, INGEST_STEP_SECONDS
+
+MIN_BATCH_ROWS = 200
+MAX_BATCH_ROWS = 50_000
+
+def _memory_mb():
+    """(current RSS, process peak RSS) in MB, both from the same source.
+
+    /proc/self/status (VmRSS/VmHWM) is cheap and exact on Linux (Render);
+    elsewhere getrusage only knows the peak, so that stands in for both.
+    """
+    try:
+        cur = peak = None
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    cur = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+        if cur is not None and peak is not None:
+            return cur, peak
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return None, None
+    # ru_maxrss is KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return peak, peak
+
+def rss_mb():
+    return _memory_mb()[0]
+
+def peak_rss_mb():
+    return _memory_mb()[1]
+
+class BatchController:
+    """Sizes ingest batches by a byte budget and by measured flush latency.
+
+    The batch is capped so its rows fit in CHUNK_SIZE_MB, then shrunk when a
+    flush takes longer than INGEST_FLUSH_MS and grown when it is much faster.
+    When RSS is above INGEST_MEM_MB *and* this step has grown it by more than
+    the byte budget, the step is asked to stop early (backpressure) so the
+    caller commits and the client polls the next step. Memory held by other
+    parts of the process (caches, freed-but-not-returned arenas) raises the
+    absolute level but not the growth, so it doesn't throttle ingest.
+    A step also yields after INGEST_STEP_SECONDS so its write transaction
+    (and the DB lock) is held for a bounded time.
+    """
+
+    def __init__(self, batch_rows=None, byte_budget_mb=CHUNK_SIZE_MB, mem_limit_mb=INGEST_MEM_MB, flush_target_ms=INGEST_FLUSH_MS,
+                 max_seconds=INGEST_STEP_SECONDS):
+        self.byte_budget = byte_budget_mb * 1048576
+        self.mem_limit_mb = mem_limit_mb
+        self.flush_target = flush_target_ms / 1000.0
+        self.batch_rows = int(batch_rows or 2000)
+        self.row_bytes = None
+        self.flushes = 0
+        self.flush_seconds = 0.0
+        self.max_seconds = max_seconds
+        self.throttled = False
+        self.time_capped = False
+        self.t0 = time.perf_counter()
+        self.start_rss = rss_mb()
+        self.peak_rss = self.start_rss
+
+    def observe_row(self, values):
+        # running estimate of in-memory bytes per row (string lengths + tuple/object overhead)
+        b = 64 + sum(len(v) if isinstance(v, str) else 24 for v in values)
+        self.row_bytes = b if self.row_bytes is None else 0.9 * self.row_bytes + 0.1 * b
+
+    def _cap(self):
+        cap = MAX_BATCH_ROWS
+        if self.row_bytes:
+            cap = min(cap, int(self.byte_budget / self.row_bytes))
+        return max(MIN_BATCH_ROWS, cap)
+
+    def limit(self):
+        return min(self.batch_rows, self._cap())
+
+    def flushed(self, rows, seconds):
+        self.flushes += 1
+        self.flush_seconds += seconds
+        if seconds > self.flush_target:
+            self.batch_rows = max(MIN_BATCH_ROWS, int(self.batch_rows * 0.5))
+        elif seconds < self.flush_target / 4 and rows >= self.batch_rows:
+            self.batch_rows = int(self.batch_rows * 1.5)
+        self.batch_rows = min(self.batch_rows, self._cap())
+
+    def should_yield(self):
+        # stop the step early if it has run long enough or memory is getting tight
+        if time.perf_counter() - self.t0 > self.max_seconds:
+            self.time_capped = True
+            return True
+        rss = rss_mb()
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, rss)
+            grown = rss - (self.start_rss or rss)
+            if rss > self.mem_limit_mb and grown * 1048576 > self.byte_budget:
+                self.batch_rows = max(MIN_BATCH_ROWS, self.batch_rows // 2)
+                self.throttled = True
+                return True
+        return False
+
+    def stats(self, rows):
+        elapsed = time.perf_counter() - self.t0
+        process_peak = peak_rss_mb()
+        return {
+            "rows": rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+            "batch_rows": self.batch_rows,
+            "row_bytes": round(self.row_bytes, 1) if self.row_bytes else None,
+            "flushes": self.flushes,
+            "flush_seconds": round(self.flush_seconds, 3),
+            # highest RSS sampled during this step vs. the process high-water mark
+            "step_peak_rss_mb": round(self.peak_rss, 1) if self.peak_rss else None,
+            "process_peak_rss_mb": round(process_peak, 1) if process_peak else None,
+            "throttled": self.throttled,
+            "time_capped": self.time_capped,
+        }
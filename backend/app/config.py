@@ -7,3 +7,8 @@ DATA_DIR = os.getenv("DATA_DIR", _default)
 ALLOW_ORIGINS = os.getenv("ALLOW_ORIGINS", "*")
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "500"))
 CHUNK_SIZE_MB = int(os.getenv("CHUNK_SIZE_MB", "8"))
+# ingest: stop a step early above this RSS, and aim for flushes of about this long
+INGEST_MEM_MB = int(os.getenv("INGEST_MEM_MB", "384"))
+INGEST_FLUSH_MS = int(os.getenv("INGEST_FLUSH_MS", "250"))
+# a step commits after this long, bounding how long it holds the DB write lock
+INGEST_STEP_SECONDS = float(os.getenv("INGEST_STEP_SECONDS", "5"))
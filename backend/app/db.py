@@ -1,4 +1,5 @@
-import os, sqlite3
+import os, re, sqlite3, threading
+from collections import OrderedDict
 
 def data_dir():
     # Prefer Render persistent disk at /data if present
@@ -9,27 +10,22 @@ def db_path():
     os.makedirs(d, exist_ok=True)
     return os.path.join(d, "app.sqlite")
 
+# seconds a connection waits for another writer (e.g. an ingest step) before "database is locked"
+SQLITE_TIMEOUT = float(os.getenv("SQLITE_TIMEOUT", "30"))
+
 def connect():
-    con = sqlite3.connect(db_path(), check_same_thread=False)
+    con = sqlite3.connect(db_path(), timeout=SQLITE_TIMEOUT, check_same_thread=False)
     con.row_factory = sqlite3.Row
     return con
 
-def init_db():
-    con = connect()
-    cur = con.cursor()
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS datasets (
-        id TEXT PRIMARY KEY,
-        name TEXT,
-        status TEXT,
-        summary_json TEXT,
-        mapping_json TEXT,
-        error TEXT,
-        created_at TEXT
-    )
-    """)
+def _add_missing_columns(cur, table, cols):
+    cur.execute(f"PRAGMA table_info({table})")
+    have = {r["name"] for r in cur.fetchall()}
+    for name, decl in cols:
+        if name not in have:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
 
+def _create_data_tables(cur):
     cur.execute("""
     CREATE TABLE IF NOT EXISTS assets (
         dataset_id TEXT,
@@ -55,6 +51,46 @@ def init_db():
     )
     """)
 
+    # natural key: asset upserts look rows up by it
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_assets_key ON assets(dataset_id, asset_id)")
+
+def _create_facts_key(cur):
+    # natural key for fact dedupe in append mode. Building it over an existing shared
+    # facts table scans every row, so init_db() leaves that to ensure_facts_key()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_facts_key ON facts(dataset_id, asset_id, year, scenario, theme, indicator)")
+
+_facts_key_ready = False
+
+def ensure_facts_key():
+    # once per process, before the first append into the shared tables; on a large
+    # existing table run `python -m app.db` once instead so no request pays for it
+    global _facts_key_ready
+    if _facts_key_ready:
+        return
+    con = connect()
+    _create_facts_key(con.cursor())
+    con.commit(); con.close()
+    _facts_key_ready = True
+
+def init_db():
+    con = connect()
+    cur = con.cursor()
+
+    # WAL lets status polls and queries read while an ingest step holds its write transaction
+    cur.execute("PRAGMA journal_mode=WAL")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS datasets (
+        id TEXT PRIMARY KEY,
+        name TEXT,
+        status TEXT,
+        summary_json TEXT,
+        mapping_json TEXT,
+        error TEXT,
+        created_at TEXT
+    )
+    """)
+
     cur.execute("""
     CREATE TABLE IF NOT EXISTS ingest_jobs (
         dataset_id TEXT PRIMARY KEY,
@@ -64,9 +100,174 @@ def init_db():
         total_rows INTEGER,
         updated_at TEXT,
         error TEXT,
-        cancel_requested INTEGER DEFAULT 0
+        cancel_requested INTEGER DEFAULT 0,
+        mode TEXT,
+        file_path TEXT,
+        rows_added INTEGER DEFAULT 0,
+        assets_added INTEGER DEFAULT 0,
+        batch_rows INTEGER,
+        byte_offset INTEGER
     )
     """)
 
+    # columns added after the first deploy; CREATE TABLE IF NOT EXISTS won't add them
+    _add_missing_columns(cur, "ingest_jobs", [
+        ("mode", "TEXT"),
+        ("file_path", "TEXT"),
+        ("rows_added", "INTEGER DEFAULT 0"),
+        ("assets_added", "INTEGER DEFAULT 0"),
+        ("batch_rows", "INTEGER"),
+        ("byte_offset", "INTEGER"),
+    ])
+
+    # shared assets/facts tables hold datasets created without per-dataset files
+    _create_data_tables(cur)
+    # the facts index is only free to build while the table is empty; otherwise it is
+    # created off the startup path (ensure_facts_key) so /api/health isn't held up
+    cur.execute("SELECT 1 FROM facts LIMIT 1")
+    if cur.fetchone() is None:
+        _create_facts_key(cur)
+
     con.commit()
     con.close()
+
+
+# --- per-dataset database files ---------------------------------------------
+# With DATASET_DB_FILES=1 each new dataset keeps its facts/assets in
+# datasets/<id>/data.sqlite. The file is opened with the central DB attached as
+# "catalog", so datasets/ingest_jobs still resolve unqualified and queries are
+# unchanged. Deleting such a dataset is an unlink instead of a DELETE scan.
+
+DATASET_DB_CACHE = int(os.getenv("DATASET_DB_CACHE", "8"))
+
+def dataset_db_files_enabled() -> bool:
+    return os.environ.get("DATASET_DB_FILES", "0").lower() in ("1", "true", "yes")
+
+class InvalidDatasetId(ValueError):
+    # answered with a 400 by the handler in main.py
+    pass
+
+# ids are uuid4 strings; anything else must at least be a single, plain path component
+_DATASET_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+
+def check_dataset_id(dataset_id) -> str:
+    # dataset ids arrive from URLs and JSON bodies and are joined into file paths
+    if not isinstance(dataset_id, str) or not _DATASET_ID.fullmatch(dataset_id):
+        raise InvalidDatasetId(dataset_id)
+    return dataset_id
+
+def dataset_db_path(dataset_id: str):
+    # same layout as storage.dataset_dir(), without creating the directory
+    return os.path.join(data_dir(), "datasets", check_dataset_id(dataset_id), "data.sqlite")
+
+class _PooledConnection(sqlite3.Connection):
+    dataset_id = None
+    generation = 0
+    def close(self):
+        _release(self)
+    def really_close(self):
+        super().close()
+
+_pool = OrderedDict()  # dataset_id -> idle connections, least recently used first
+_pool_lock = threading.Lock()
+# dataset_id -> bumped whenever the dataset's file is dropped; handles opened
+# before that point still reference the unlinked inode and must not be reused
+_db_generation = {}
+
+def _release(con):
+    if con.in_transaction:
+        con.rollback()
+    with _pool_lock:
+        stale = con.generation != _db_generation.get(con.dataset_id, 0)
+        if not stale:
+            _pool.setdefault(con.dataset_id, []).append(con)
+            _pool.move_to_end(con.dataset_id)
+        idle = sum(len(v) for v in _pool.values())
+        while idle > DATASET_DB_CACHE:
+            ds, cons = next(iter(_pool.items()))
+            cons.pop(0).really_close(); idle -= 1
+            if not cons: del _pool[ds]
+    if stale:
+        con.really_close()
+
+def _create_progress_table(cur):
+    # resume state of the dataset's current ingest job. It lives in the dataset's own
+    # file so it commits together with the rows: SQLite doesn't make a transaction
+    # spanning an ATTACHed database atomic in WAL mode, so ingest_jobs (in the catalog)
+    # only gets a copy after the file has committed. Counts are the dataset's totals.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS main.ingest_progress (
+        dataset_id TEXT PRIMARY KEY,
+        processed_rows INTEGER,
+        byte_offset INTEGER,
+        rows_added INTEGER,
+        assets_added INTEGER,
+        batch_rows INTEGER,
+        row_count INTEGER,
+        asset_count INTEGER
+    )
+    """)
+
+def dataset_db_exists(dataset_id: str) -> bool:
+    return os.path.exists(dataset_db_path(dataset_id))
+
+def create_dataset_db(dataset_id: str):
+    path = dataset_db_path(dataset_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=WAL")
+    _create_data_tables(con.cursor())
+    _create_facts_key(con.cursor())
+    _create_progress_table(con.cursor())
+    con.commit(); con.close()
+
+def evict_dataset_db(dataset_id: str):
+    # closes idle handles now; checked-out ones are closed when they are released
+    with _pool_lock:
+        cons = _pool.pop(dataset_id, [])
+        _db_generation[dataset_id] = _db_generation.get(dataset_id, 0) + 1
+    for c in cons:
+        c.really_close()
+
+def drop_dataset_db(dataset_id: str) -> bool:
+    # returns False if the dataset lives in the shared tables
+    path = dataset_db_path(dataset_id)
+    if not os.path.exists(path):
+        return False
+    evict_dataset_db(dataset_id)
+    for suffix in ("", "-wal", "-shm"):
+        try: os.remove(path + suffix)
+        except FileNotFoundError: pass
+    return True
+
+def connect_dataset(dataset_id: str):
+    # connection for reading/writing one dataset's facts/assets; callers close() as usual
+    path = dataset_db_path(dataset_id)
+    if not os.path.exists(path):
+        return connect()
+    stale = []
+    with _pool_lock:
+        generation = _db_generation.get(dataset_id, 0)
+        cons = _pool.get(dataset_id) or []
+        con = None
+        while cons and con is None:
+            c = cons.pop()
+            if c.generation == generation: con = c
+            else: stale.append(c)
+        if not cons: _pool.pop(dataset_id, None)
+    for c in stale:
+        c.really_close()
+    if con is not None:
+        return con
+    con = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, check_same_thread=False, factory=_PooledConnection)
+    con.row_factory = sqlite3.Row
+    con.dataset_id = dataset_id
+    con.generation = generation
+    con.execute("ATTACH DATABASE ? AS catalog", (db_path(),))
+    return con
+
+if __name__ == "__main__":
+    # one-off migration: build the shared facts index ahead of the first append
+    init_db()
+    ensure_facts_key()
+    print("idx_facts_key ready")
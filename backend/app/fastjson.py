@@ -0,0 +1,47 @@
+import json
+from typing import Any, Dict, Optional
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as _FastResponse
+except ImportError:  # orjson is optional; fall back to stdlib json without jsonable_encoder
+    orjson = None
+    _FastResponse = None
+
+# "json"    -> legacy path: list of dicts, encoded by FastAPI (default, unchanged)
+# "rows"    -> same row-oriented shape, but serialized straight from cursor tuples
+# "columns" -> {"columns": [...], "data": [[...], ...]}
+FORMATS = ("json", "rows", "columns")
+
+def check_format(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(FORMATS)}")
+    return fmt
+
+def fetch_tuples(cur, sql: str, params):
+    # bypass sqlite3.Row for this cursor; plain tuples are much cheaper to build
+    cur.row_factory = None
+    cur.execute(sql, params)
+    cols = [d[0] for d in cur.description]
+    return cols, cur.fetchall()
+
+def shape(cols, data, fmt: str):
+    if fmt == "columns":
+        return {"columns": cols, "data": data}
+    return [dict(zip(cols, t)) for t in data]
+
+def fast_response(content: Any) -> Response:
+    if _FastResponse is not None:
+        return _FastResponse(content)
+    return Response(json.dumps(content, separators=(",", ":")), media_type="application/json")
+
+def respond(cols, data, fmt: str, envelope: Optional[Dict[str, Any]] = None, key: str = "rows"):
+    # envelope: extra top-level fields (limit/offset); rows go under `key`, columns are merged in
+    body = shape(cols, data, fmt)
+    if envelope is None:
+        return fast_response(body)
+    out = dict(body) if fmt == "columns" else {key: body}
+    out.update(envelope)
+    return fast_response(out)
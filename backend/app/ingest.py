@@ -1,7 +1,7 @@
-import os, csv, datetime, json
-from typing import Dict, Any
-import pandas as pd
-from .db import connect
+import os, csv, time, datetime, json, random
+from typing import Dict, Any, Optional
+from .db import connect_dataset, dataset_db_exists, _create_progress_table
+from .batching import BatchController
 
 def detect_columns(file_path: str) -> Dict[str, Any]:
     ext = os.path.splitext(file_path)[1].lower()
@@ -11,6 +11,7 @@ def detect_columns(file_path: str) -> Dict[str, Any]:
             reader = csv.reader(f)
             cols = next(reader, [])
     elif ext in (".xlsx", ".xls"):
+        import pandas as pd  # only needed for spreadsheets; keeps pandas out of cold start
         df = pd.read_excel(file_path, sheet_name=0, nrows=0)
         cols = list(df.columns)
     else:
@@ -35,23 +36,171 @@ def detect_columns(file_path: str) -> Dict[str, Any]:
     }
     return {"columns": cols, "guess": guess}
 
+PROFILE_PROBES = 32
+PROFILE_ROWS = 2048
+PROFILE_TOP_VALUES = 20
+
+def _infer_type(v: str):
+    if v == "": return None
+    try:
+        int(v); return "int"
+    except ValueError: pass
+    try:
+        float(v); return "float"
+    except ValueError: return "str"
+
+def _sample_lines(file_path: str, probes: int, per_probe: int, seed: int):
+    # header + lines from the top of the file + lines after `probes` random offsets;
+    # never scans the file, so the cost is independent of its size
+    size = os.path.getsize(file_path)
+    rnd = random.Random(seed)
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        start = f.tell()
+        offsets = [start] + sorted(rnd.randrange(start, size) for _ in range(probes - 1)) if size > start else []
+        lines, last_end = [], start
+        for off in offsets:
+            if off < last_end:
+                continue  # overlaps the previous probe
+            f.seek(off)
+            if off != start:
+                f.readline()  # drop the partial line we landed in
+            for _ in range(per_probe):
+                ln = f.readline()
+                if not ln: break
+                lines.append(ln)
+            last_end = f.tell()
+    return size, header, lines
+
+def profile_csv(file_path: str, guess: Optional[Dict[str, Any]] = None, sample_rows: int = PROFILE_ROWS,
+                probes: int = PROFILE_PROBES, seed: int = 0) -> Dict[str, Any]:
+    size, header_b, lines = _sample_lines(file_path, probes, max(1, sample_rows // probes), seed)
+    header = next(csv.reader([header_b.decode("utf-8-sig", errors="replace")]), [])
+    rows = [r for r in csv.reader(ln.decode("utf-8", errors="replace") for ln in lines) if len(r) == len(header)]
+
+    sampled_bytes = sum(len(ln) for ln in lines)
+    est_rows = int(round((size - len(header_b)) / (sampled_bytes / len(lines)))) if lines else 0
+
+    columns = {}
+    for i, name in enumerate(header):
+        vals = [r[i].strip() for r in rows]
+        types = {}
+        for v in vals:
+            t = _infer_type(v)
+            if t: types[t] = types.get(t, 0) + 1
+        non_null = sum(types.values())
+        if not non_null: kind = "empty"
+        elif types.get("str"): kind = "str"
+        elif types.get("float"): kind = "float"
+        else: kind = "int"
+        c = {"type": kind, "null_frac": round(1 - non_null / len(vals), 4) if vals else None,
+             "distinct": len(set(v for v in vals if v))}
+        if kind in ("int", "float"):
+            nums = [float(v) for v in vals if v]
+            c["min"] = min(nums); c["max"] = max(nums)
+        columns[name] = c
+
+    guess = guess or {}
+    warnings = []
+    def check_numeric(key, lo=None, hi=None):
+        name = guess.get(key)
+        if not name: return
+        c = columns.get(name) or {}
+        if c.get("type") not in ("int", "float"):
+            warnings.append(f"{key} '{name}' is not numeric in the sample (type={c.get('type')})")
+        elif lo is not None and (c["min"] < lo or c["max"] > hi):
+            warnings.append(f"{key} '{name}' has values outside [{lo}, {hi}] ({c['min']}..{c['max']})")
+    check_numeric("lat_col", -90, 90)
+    check_numeric("lon_col", -180, 180)
+    check_numeric("value_col")
+    if guess.get("year_col") and columns.get(guess["year_col"], {}).get("type") != "int":
+        warnings.append(f"year_col '{guess['year_col']}' is not integer in the sample")
+    if not guess.get("asset_id_col"):
+        warnings.append("no asset id column detected")
+
+    # cardinality of the dimension columns, with the most common sampled values
+    dimensions = {}
+    for key in ("asset_id_col", "year_col", "scenario_col", "theme_col", "indicator_col"):
+        name = guess.get(key)
+        if not name or name not in header: continue
+        i = header.index(name)
+        counts = {}
+        for r in rows:
+            v = r[i].strip()
+            if v: counts[v] = counts.get(v, 0) + 1
+        top = sorted(counts, key=counts.get, reverse=True)[:PROFILE_TOP_VALUES]
+        dimensions[key] = {"column": name, "distinct_in_sample": len(counts), "top_values": top}
+
+    return {"file_bytes": size, "sampled_rows": len(rows), "estimated_rows": est_rows,
+            "columns": columns, "dimensions": dimensions, "warnings": warnings}
+
 def _now():
     return datetime.datetime.utcnow().isoformat() + "Z"
 
-def ingest_step_sqlite(dataset_id: str, file_path: str, mapping: Dict[str, Any], chunk_rows: int = 5000, cancel_cb=None) -> Dict[str, Any]:
+INSERT_FACT = "INSERT INTO facts(dataset_id, asset_id, latitude, longitude, year, scenario, theme, indicator, value, units) VALUES (?,?,?,?,?,?,?,?,?,?)"
+# natural key is (asset, year, scenario, theme, indicator); IS makes NULL dimensions compare equal
+UPDATE_FACT = ("UPDATE facts SET latitude=?, longitude=?, value=?, units=? "
+               "WHERE dataset_id=? AND asset_id=? AND year IS ? AND scenario IS ? AND theme IS ? AND indicator IS ?")
+
+INGEST_MODES = ("replace", "append")
+
+def _read_progress(cur, dataset_id: str, in_file: bool) -> Dict[str, Any]:
+    # per-dataset files keep the authoritative state in main.ingest_progress; shared
+    # tables (and files whose job predates that table) use ingest_jobs/summary_json
+    cur.execute("SELECT summary_json FROM datasets WHERE id=?", (dataset_id,))
+    row = cur.fetchone()
+    summary = json.loads(row["summary_json"]) if row and row["summary_json"] else {}
+    if in_file:
+        _create_progress_table(cur)
+        cur.execute("SELECT * FROM main.ingest_progress WHERE dataset_id=?", (dataset_id,))
+        row = cur.fetchone()
+        if row:
+            summary["row_count"], summary["asset_count"] = row["row_count"], row["asset_count"]
+            return {**dict(row), "summary": summary}
+    cur.execute("SELECT processed_rows, byte_offset, rows_added, assets_added, batch_rows FROM ingest_jobs WHERE dataset_id=?", (dataset_id,))
+    row = cur.fetchone()
+    state = dict(row) if row else dict.fromkeys(("processed_rows", "byte_offset", "rows_added", "assets_added", "batch_rows"))
+    return {**state, "summary": summary}
+
+def _copy_progress(cur, dataset_id: str, progress, summary):
+    processed, offset, rows_added, assets_added, batch_rows = progress
+    cur.execute("UPDATE datasets SET summary_json=? WHERE id=?", (json.dumps(summary), dataset_id))
+    cur.execute("UPDATE ingest_jobs SET processed_rows=?, byte_offset=?, rows_added=?, assets_added=?, batch_rows=?, updated_at=?, error=NULL WHERE dataset_id=?",
+                (processed, offset, rows_added, assets_added, batch_rows, _now(), dataset_id))
+
+def reset_progress(dataset_id: str):
+    # a new job on an existing file starts from the top; called before ingest_jobs is reset
+    if not dataset_db_exists(dataset_id):
+        return
+    con = connect_dataset(dataset_id); cur = con.cursor()
+    _create_progress_table(cur)
+    cur.execute("DELETE FROM main.ingest_progress WHERE dataset_id=?", (dataset_id,))
+    con.commit(); con.close()
+
+def ingest_step_sqlite(dataset_id: str, file_path: str, mapping: Dict[str, Any], chunk_rows: int = 5000, cancel_cb=None, mode: str = "replace") -> Dict[str, Any]:
+    # mode="replace": the dataset is empty, every row is a new fact.
+    # mode="append":  the dataset already has data; facts are upserted on the natural key.
     if cancel_cb is None:
         cancel_cb = lambda: False
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode: {mode}")
 
     ext = os.path.splitext(file_path)[1].lower()
     if ext != ".csv":
         raise RuntimeError("For large datasets on Render, please upload CSV. (XLSX is supported only for small files.)")
 
-    con = connect(); cur = con.cursor()
+    in_file = dataset_db_exists(dataset_id)
+    con = connect_dataset(dataset_id); cur = con.cursor()
 
-    # current progress
-    cur.execute("SELECT processed_rows FROM ingest_jobs WHERE dataset_id=?", (dataset_id,))
-    row = cur.fetchone()
-    processed = int(row["processed_rows"] or 0) if row else 0
+    # current progress; byte_offset is the file position after the last committed row
+    state = _read_progress(cur, dataset_id, in_file)
+    processed = int(state["processed_rows"] or 0)
+    offset = state["byte_offset"]
+    rows_added = int(state["rows_added"] or 0)
+    assets_added = int(state["assets_added"] or 0)
+    # batch size carries over from the previous step's controller
+    ctl = BatchController(batch_rows=state["batch_rows"])
+    rows_before, assets_before = rows_added, assets_added
 
     # mapping
     def col(name, fallback=None):
@@ -74,75 +223,135 @@ def ingest_step_sqlite(dataset_id: str, file_path: str, mapping: Dict[str, Any],
             return int(float(x))
         except: return None
 
+    # assets already written during this step -> (label, lat, lon); skips repeat upserts for the same values
+    seen_assets = {}
     def upsert_asset(aid, label, lat, lon):
         cur.execute("SELECT 1 FROM assets WHERE dataset_id=? AND asset_id=? LIMIT 1", (dataset_id, aid))
         if cur.fetchone():
             cur.execute("UPDATE assets SET label=?, latitude=?, longitude=? WHERE dataset_id=? AND asset_id=?",
                         (label, lat, lon, dataset_id, aid))
-        else:
-            cur.execute("INSERT INTO assets(dataset_id, asset_id, label, latitude, longitude) VALUES (?,?,?,?,?)",
-                        (dataset_id, aid, label, lat, lon))
+            return 0
+        cur.execute("INSERT INTO assets(dataset_id, asset_id, label, latitude, longitude) VALUES (?,?,?,?,?)",
+                    (dataset_id, aid, label, lat, lon))
+        return 1
+
+    def upsert_fact(t):
+        # t is an INSERT_FACT tuple; returns 1 if a new fact was inserted
+        cur.execute(UPDATE_FACT, (t[2], t[3], t[8], t[9], t[0], t[1], t[4], t[5], t[6], t[7]))
+        if cur.rowcount:
+            return 0
+        cur.execute(INSERT_FACT, t)
+        return 1
 
+    consumed = 0
     inserted = 0
+    cancelled = False
+    eof = False
     batch = []
 
-    with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
-        # skip processed rows
-        for _ in range(processed):
-            try: next(reader)
-            except StopIteration: break
+    def flush():
+        # the whole step is one transaction; a flush only hands the batch to SQLite
+        nonlocal inserted, rows_added
+        t0 = time.perf_counter()
+        if mode == "append":
+            for t in batch:
+                rows_added += upsert_fact(t)
+        else:
+            cur.executemany(INSERT_FACT, batch)
+            rows_added += len(batch)
+        inserted += len(batch)
+        ctl.flushed(len(batch), time.perf_counter() - t0)
+        batch.clear()
+
+    with open(file_path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8-sig")]), [])
+        pos = f.tell()
+        if offset:
+            f.seek(offset); pos = offset
+
+        # csv.reader pulls exactly the lines of one record per row, so `pos` after
+        # a row is that row's end -- a safe place to resume from
+        def lines():
+            nonlocal pos
+            for ln in iter(f.readline, b""):
+                pos += len(ln)
+                yield ln.decode("utf-8")
+        reader = csv.reader(lines())
+        if processed and offset is None:
+            # job started before offsets were recorded: skip by row count
+            for _ in range(processed):
+                if next(reader, None) is None: break
 
-        for r in reader:
-            if cancel_cb():
+        while True:
+            values = next(reader, None)
+            if values is None:
+                eof = True
                 break
+            if not values:
+                continue  # blank line (DictReader skipped these too)
+            r = dict(zip(header, values))
+            consumed += 1
+            if consumed % 64 == 1:
+                ctl.observe_row(r.values())
             aid = (r.get(asset_id_col) or "").strip()
-            if not aid:
-                continue
-            lat = to_float(r.get(lat_col)); lon = to_float(r.get(lon_col))
-            label = (r.get(label_col) or aid).strip()
-            upsert_asset(aid, label, lat, lon)
-
-            batch.append((
-                dataset_id,
-                aid, lat, lon,
-                to_int(r.get(year_col)),
-                (r.get(scenario_col) or "").strip() or None,
-                (r.get(theme_col) or "").strip() or None,
-                (r.get(indicator_col) or "").strip() or None,
-                to_float(r.get(value_col)),
-                (r.get(units_col) or "").strip() or None
-            ))
-            if len(batch) >= 2000:
-                cur.executemany("INSERT INTO facts(dataset_id, asset_id, latitude, longitude, year, scenario, theme, indicator, value, units) VALUES (?,?,?,?,?,?,?,?,?,?)", batch)
-                inserted += len(batch)
-                processed += len(batch)
-                batch.clear()
-                con.commit()
-                if inserted >= chunk_rows:
+            if aid:
+                lat = to_float(r.get(lat_col)); lon = to_float(r.get(lon_col))
+                label = (r.get(label_col) or aid).strip()
+                if seen_assets.get(aid) != (label, lat, lon):
+                    assets_added += upsert_asset(aid, label, lat, lon)
+                    seen_assets[aid] = (label, lat, lon)
+
+                batch.append((
+                    dataset_id,
+                    aid, lat, lon,
+                    to_int(r.get(year_col)),
+                    (r.get(scenario_col) or "").strip() or None,
+                    (r.get(theme_col) or "").strip() or None,
+                    (r.get(indicator_col) or "").strip() or None,
+                    to_float(r.get(value_col)),
+                    (r.get(units_col) or "").strip() or None
+                ))
+            if len(batch) >= ctl.limit():
+                flush()
+                # cancel_cb opens its own connection; poll it once per batch rather than per row
+                if cancel_cb():
+                    cancelled = True
+                    break
+                if ctl.should_yield():
                     break
+            if consumed >= chunk_rows:
+                break
 
-        if batch and not cancel_cb():
-            cur.executemany("INSERT INTO facts(dataset_id, asset_id, latitude, longitude, year, scenario, theme, indicator, value, units) VALUES (?,?,?,?,?,?,?,?,?,?)", batch)
-            inserted += len(batch)
-            processed += len(batch)
-            con.commit()
+        if batch and not cancelled:
+            flush()
+        offset = pos
 
-    # update job progress
-    cur.execute("UPDATE ingest_jobs SET processed_rows=?, updated_at=?, error=NULL WHERE dataset_id=?",
-                (processed, _now(), dataset_id))
-    con.commit()
+    if cancelled:
+        # drop the partial step; the job is resumed from the last committed position
+        con.rollback()
+        con.close()
+        return {"processed_rows": processed, "inserted_this_step": 0, "done": False, "cancelled": True, "stats": ctl.stats(consumed)}
 
-    # if we inserted less than chunk_rows, assume EOF reached
-    done = inserted < chunk_rows
-
-    result = {"processed_rows": processed, "inserted_this_step": inserted, "done": done}
-    if done:
-        cur.execute("SELECT COUNT(*) AS c FROM facts WHERE dataset_id=?", (dataset_id,))
-        row_count = int(cur.fetchone()["c"])
-        cur.execute("SELECT COUNT(DISTINCT asset_id) AS c FROM assets WHERE dataset_id=?", (dataset_id,))
-        asset_count = int(cur.fetchone()["c"])
-        result.update({"row_count": row_count, "asset_count": asset_count})
+    processed += consumed
+    step_rows = rows_added - rows_before
+    step_assets = assets_added - assets_before
 
+    # refresh counts by this step's delta instead of COUNT(*) scans
+    summary = state["summary"]
+    summary["row_count"] = int(summary.get("row_count") or 0) + (rows_added - rows_before)
+    summary["asset_count"] = int(summary.get("asset_count") or 0) + (assets_added - assets_before)
+    progress = (processed, offset, rows_added, assets_added, ctl.batch_rows)
+    if in_file:
+        # commit the rows with their resume state first; the catalog copy below is
+        # re-derived from this on the next step if the process dies in between
+        cur.execute("INSERT OR REPLACE INTO main.ingest_progress VALUES (?,?,?,?,?,?,?,?)",
+                    (dataset_id, *progress, summary["row_count"], summary["asset_count"]))
+        con.commit()
+    _copy_progress(cur, dataset_id, progress, summary)
+    con.commit()
     con.close()
-    return result
+
+    return {"processed_rows": processed, "inserted_this_step": inserted, "done": eof,
+            "rows_added": rows_added, "assets_added": assets_added,
+            "row_count": summary["row_count"], "asset_count": summary["asset_count"], "summary": summary,
+            "stats": ctl.stats(consumed)}
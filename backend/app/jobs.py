@@ -1,5 +1,6 @@
-import datetime
-from .db import connect
+import os, datetime
+from .db import connect, check_dataset_id
+from .storage import datasets_root
 
 def _now():
     return datetime.datetime.utcnow().isoformat() + "Z"
@@ -29,10 +30,29 @@ def job_upsert(dataset_id: str, **fields):
         cur.execute(f"UPDATE ingest_jobs SET {', '.join(sets)} WHERE dataset_id=?", vals)
     con.commit(); con.close()
 
+def _cancel_marker(dataset_id: str):
+    return os.path.join(datasets_root(), check_dataset_id(dataset_id), "cancel")
+
 def request_cancel(dataset_id: str):
-    job_upsert(dataset_id, cancel_requested=1, updated_at=_now())
+    # marker file first: a running ingest step holds the DB write lock until it commits,
+    # but polls this file between batches
+    if os.path.isdir(os.path.dirname(_cancel_marker(dataset_id))):
+        open(_cancel_marker(dataset_id), "w").close()
+    # conditional: this UPDATE may wait on that lock, and must not overwrite the FAILED/READY
+    # state the step wrote when it saw the marker and stopped
+    con = connect(); cur = con.cursor()
+    cur.execute(
+        "UPDATE ingest_jobs SET cancel_requested=1, status='CANCEL_REQUESTED', stage='cancel', updated_at=? WHERE dataset_id=? AND status NOT IN ('FAILED','READY')",
+        (_now(), dataset_id))
+    con.commit(); con.close()
+
+def clear_cancel(dataset_id: str):
+    try: os.remove(_cancel_marker(dataset_id))
+    except FileNotFoundError: pass
 
 def cancel_requested(dataset_id: str) -> bool:
+    if os.path.exists(_cancel_marker(dataset_id)):
+        return True
     con = connect(); cur = con.cursor()
     cur.execute("SELECT cancel_requested FROM ingest_jobs WHERE dataset_id=?", (dataset_id,))
     row = cur.fetchone()
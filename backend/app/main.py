@@ -1,8 +1,13 @@
-from fastapi import FastAPI
+import os, threading
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .db import init_db
+from .db import init_db, InvalidDatasetId
 from .routes_upload import router as upload_router
 from .routes_datasets import router as datasets_router
+from .routes_analytics import router as analytics_router
+from .routes_reports import router as reports_router
+from .routes_ai import router as ai_router
 
 app = FastAPI(title="ClimSystems Upload POC (Render-safe)")
 
@@ -14,9 +19,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def warmup():
+    # pandas (xlsx detect), matplotlib and reportlab (reports) are imported lazily;
+    # WARMUP=1 loads them in the background after startup so the first report isn't slow
+    import pandas
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot
+    import reportlab.pdfgen.canvas
+
 @app.on_event("startup")
 def _startup():
     init_db()
+    if os.getenv("WARMUP", "0").lower() in ("1", "true", "yes"):
+        threading.Thread(target=warmup, name="warmup", daemon=True).start()
+
+@app.exception_handler(InvalidDatasetId)
+def _invalid_dataset_id(request: Request, exc: InvalidDatasetId):
+    # raised wherever a dataset id is turned into a path (db.dataset_db_path, storage.dataset_dir)
+    return JSONResponse(status_code=400, content={"detail": "Invalid dataset_id"})
 
 @app.get("/api/health")
 def health():
@@ -24,3 +45,6 @@ def health():
 
 app.include_router(upload_router, prefix="/api")
 app.include_router(datasets_router, prefix="/api")
+app.include_router(analytics_router, prefix="/api")
+app.include_router(reports_router, prefix="/api")
+app.include_router(ai_router, prefix="/api")
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from .db import connect
+from .db import connect_dataset
 
 router = APIRouter()
 
@@ -26,7 +26,7 @@ def ask(payload: dict):
 
     # Provide dataset-aware hints if possible
     if dataset_id:
-        con = connect(); cur = con.cursor()
+        con = connect_dataset(dataset_id); cur = con.cursor()
         cur.execute("SELECT COUNT(DISTINCT indicator) AS n_ind, COUNT(DISTINCT theme) AS n_theme FROM facts WHERE dataset_id=?", (dataset_id,))
         row = cur.fetchone(); con.close()
         if row:
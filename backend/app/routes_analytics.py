@@ -1,6 +1,8 @@
 from typing import Optional, List
-from fastapi import APIRouter, Query
-from .db import connect
+from fastapi import APIRouter, Query, HTTPException
+from .db import connect, connect_dataset
+from .fastjson import check_format, fetch_tuples, respond
+from .spatial import get_index
 
 router = APIRouter()
 
@@ -12,7 +14,7 @@ def _in_clause(col, values):
 
 @router.get("/datasets/{dataset_id}/filter-options")
 def filter_options(dataset_id: str):
-    con = connect(); cur = con.cursor()
+    con = connect_dataset(dataset_id); cur = con.cursor()
     def distinct(col):
         cur.execute(f"SELECT DISTINCT {col} AS v FROM facts WHERE dataset_id=? AND {col} IS NOT NULL ORDER BY v", (dataset_id,))
         return [r["v"] for r in cur.fetchall()]
@@ -21,16 +23,76 @@ def filter_options(dataset_id: str):
     return out
 
 @router.get("/datasets/{dataset_id}/assets")
-def list_assets(dataset_id: str, q: Optional[str]=None, limit: int = 5000):
-    con = connect(); cur = con.cursor()
+def list_assets(dataset_id: str, q: Optional[str]=None, limit: int = 5000, fmt: str = Query("json", alias="format")):
+    check_format(fmt)
+    con = connect_dataset(dataset_id); cur = con.cursor()
     if q:
-        cur.execute("SELECT asset_id, latitude, longitude, label FROM assets WHERE dataset_id=? AND (asset_id LIKE ? OR label LIKE ?) LIMIT ?", (dataset_id, f"%{q}%", f"%{q}%", limit))
+        sql, params = "SELECT asset_id, latitude, longitude, label FROM assets WHERE dataset_id=? AND (asset_id LIKE ? OR label LIKE ?) LIMIT ?", (dataset_id, f"%{q}%", f"%{q}%", limit)
     else:
-        cur.execute("SELECT asset_id, latitude, longitude, label FROM assets WHERE dataset_id=? LIMIT ?", (dataset_id, limit))
+        sql, params = "SELECT asset_id, latitude, longitude, label FROM assets WHERE dataset_id=? LIMIT ?", (dataset_id, limit)
+    if fmt != "json":
+        cols, data = fetch_tuples(cur, sql, params)
+        con.close()
+        return respond(cols, data, fmt)
+    cur.execute(sql, params)
     rows = [dict(r) for r in cur.fetchall()]
     con.close()
     return rows
 
+NEAR_MAX_K = 500
+
+@router.get("/datasets/{dataset_id}/assets/near")
+def assets_near(
+    dataset_id: str,
+    lat: float,
+    lon: float,
+    k: int = 10,
+    radius_km: Optional[float] = None,
+    years: Optional[List[int]] = Query(default=None),
+    scenarios: Optional[List[str]] = Query(default=None),
+    themes: Optional[List[str]] = Query(default=None),
+    indicators: Optional[List[str]] = Query(default=None),
+    fmt: str = Query("json", alias="format"),
+):
+    # k nearest assets (optionally within radius_km) with MAX(value) under the filters
+    check_format(fmt)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(400, "lat must be within [-90, 90] and lon within [-180, 180]")
+    if not (1 <= k <= NEAR_MAX_K):
+        raise HTTPException(400, f"k must be between 1 and {NEAR_MAX_K}")
+    if radius_km is not None and radius_km < 0:
+        raise HTTPException(400, "radius_km must be >= 0")
+    # check before building, so an unknown id doesn't cache an empty index
+    con = connect(); cur = con.cursor()
+    cur.execute("SELECT 1 FROM datasets WHERE id=?", (dataset_id,))
+    found = cur.fetchone()
+    con.close()
+    if not found: raise HTTPException(404, "Dataset not found")
+    index = get_index(dataset_id)
+    con = connect_dataset(dataset_id); cur = con.cursor()
+    hits = index.query(lat, lon, k=k, radius_km=radius_km, con=con)
+
+    scores = {}
+    if hits:
+        ids = [h["asset_id"] for h in hits]
+        sql = "SELECT asset_id, MAX(value) AS score FROM facts WHERE dataset_id=?"
+        params = [dataset_id]
+        for col, vals in [("asset_id", ids), ("year", years), ("scenario", scenarios), ("theme", themes), ("indicator", indicators)]:
+            clause, p = _in_clause(col, vals)
+            sql += clause
+            params += p
+        sql += " GROUP BY asset_id"
+        cur.execute(sql, params)
+        scores = {r["asset_id"]: r["score"] for r in cur.fetchall()}
+    con.close()
+    for h in hits:
+        h["score"] = scores.get(h["asset_id"])
+
+    if fmt != "json":
+        cols = ["asset_id", "label", "latitude", "longitude", "distance_km", "score"]
+        return respond(cols, [tuple(h[c] for c in cols) for h in hits], fmt)
+    return hits
+
 @router.get("/datasets/{dataset_id}/facts")
 def facts(
     dataset_id: str,
@@ -41,8 +103,10 @@ def facts(
     indicators: Optional[List[str]] = Query(default=None),
     limit: int = 5000,
     offset: int = 0,
+    fmt: str = Query("json", alias="format"),
 ):
-    con = connect(); cur = con.cursor()
+    check_format(fmt)
+    con = connect_dataset(dataset_id); cur = con.cursor()
     sql = "SELECT asset_id, latitude, longitude, year, scenario, theme, indicator, value, units FROM facts WHERE dataset_id=?"
     params = [dataset_id]
     for col, vals in [("asset_id", assets), ("year", years), ("scenario", scenarios), ("theme", themes), ("indicator", indicators)]:
@@ -51,6 +115,10 @@ def facts(
         params += p
     sql += " ORDER BY asset_id LIMIT ? OFFSET ?"
     params += [limit, offset]
+    if fmt != "json":
+        cols, data = fetch_tuples(cur, sql, params)
+        con.close()
+        return respond(cols, data, fmt, envelope={"limit": limit, "offset": offset})
     cur.execute(sql, params)
     rows = [dict(r) for r in cur.fetchall()]
     con.close()
@@ -63,9 +131,11 @@ def top_assets(
     scenarios: Optional[List[str]] = Query(default=None),
     themes: Optional[List[str]] = Query(default=None),
     indicators: Optional[List[str]] = Query(default=None),
-    top_n: int = 20
+    top_n: int = 20,
+    fmt: str = Query("json", alias="format"),
 ):
-    con = connect(); cur = con.cursor()
+    check_format(fmt)
+    con = connect_dataset(dataset_id); cur = con.cursor()
     sql = "SELECT asset_id, MAX(value) AS score FROM facts WHERE dataset_id=?"
     params = [dataset_id]
     for col, vals in [("year", years), ("scenario", scenarios), ("theme", themes), ("indicator", indicators)]:
@@ -74,6 +144,10 @@ def top_assets(
         params += p
     sql += " GROUP BY asset_id ORDER BY score DESC LIMIT ?"
     params.append(top_n)
+    if fmt != "json":
+        cols, data = fetch_tuples(cur, sql, params)
+        con.close()
+        return respond(cols, data, fmt)
     cur.execute(sql, params)
     rows = [dict(r) for r in cur.fetchall()]
     con.close()
@@ -91,7 +165,7 @@ def export_csv(
 ):
     from fastapi.responses import StreamingResponse
     import io, csv
-    con = connect(); cur = con.cursor()
+    con = connect_dataset(dataset_id); cur = con.cursor()
     sql = "SELECT asset_id, latitude, longitude, year, scenario, theme, indicator, value, units FROM facts WHERE dataset_id=?"
     params = [dataset_id]
     for col, vals in [("asset_id", assets), ("year", years), ("scenario", scenarios), ("theme", themes), ("indicator", indicators)]:
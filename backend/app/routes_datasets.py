@@ -1,9 +1,12 @@
 import os, json, datetime, shutil
-from fastapi import APIRouter, HTTPException
-from .db import connect
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from .db import connect, create_dataset_db, drop_dataset_db, dataset_db_exists, ensure_facts_key
+from .fastjson import check_format, fetch_tuples, respond
+from . import spatial
 from .storage import dataset_dir
-from .jobs import job_get, job_upsert, request_cancel, cancel_requested
-from .ingest import detect_columns, ingest_step_sqlite
+from .jobs import job_get, job_upsert, request_cancel, cancel_requested, clear_cancel
+from .ingest import detect_columns, ingest_step_sqlite, reset_progress, INGEST_MODES
 
 router = APIRouter()
 
@@ -21,9 +24,27 @@ def get_dataset(dataset_id: str):
     d["mapping"] = json.loads(d["mapping_json"]) if d.get("mapping_json") else None
     return d
 
+def _read_meta(dataset_id: str, required: bool = True):
+    meta_path = os.path.join(dataset_dir(dataset_id), "meta.json")
+    if not os.path.exists(meta_path):
+        if not required: return {}
+        raise HTTPException(404, "Original file not found")
+    return json.loads(open(meta_path, "r", encoding="utf-8").read())
+
+def _write_meta(dataset_id: str, meta: dict):
+    with open(os.path.join(dataset_dir(dataset_id), "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
 @router.get("/datasets")
-def list_datasets():
+def list_datasets(fmt: str = Query("json", alias="format")):
+    check_format(fmt)
     con = connect(); cur = con.cursor()
+    if fmt != "json":
+        cols, data = fetch_tuples(cur, "SELECT * FROM datasets ORDER BY created_at DESC LIMIT 200", ())
+        con.close()
+        i = cols.index("summary_json")
+        data = [t + (json.loads(t[i]) if t[i] else None,) for t in data]
+        return respond(cols + ["summary"], data, fmt)
     cur.execute("SELECT * FROM datasets ORDER BY created_at DESC LIMIT 200")
     rows = [dict(r) for r in cur.fetchall()]
     con.close()
@@ -50,38 +71,87 @@ def rename_dataset(dataset_id: str, name: str):
 def dataset_status(dataset_id: str):
     ds = get_dataset(dataset_id)
     job = job_get(dataset_id)
+    if job and job.get("total_rows"):
+        # total_rows is estimated from the finalize profile, so clamp until the job is done
+        job["percent"] = min(99.9, round(100.0 * (job.get("processed_rows") or 0) / job["total_rows"], 1)) if job.get("status") != "READY" else 100.0
     return {"dataset": ds, "job": job}
 
 @router.post("/datasets/{dataset_id}/cancel")
 def cancel_ingest(dataset_id: str):
     request_cancel(dataset_id)
-    job_upsert(dataset_id, status="CANCEL_REQUESTED", stage="cancel", updated_at=_now())
     return {"ok": True}
 
 @router.post("/datasets/{dataset_id}/ingest")
-def start_ingest(dataset_id: str, mapping: dict):
+def start_ingest(dataset_id: str, mapping: dict, mode: str = "replace"):
+    # mode=replace reloads the original from scratch; mode=append re-ingests it over the
+    # existing rows (facts upserted on the natural key), e.g. after a value/units mapping change
     ds = get_dataset(dataset_id)
     if not ds: raise HTTPException(404, "Dataset not found")
+    if mode not in INGEST_MODES: raise HTTPException(400, f"mode must be one of {', '.join(INGEST_MODES)}")
+    if mode == "append" and ds.get("status") != "READY": raise HTTPException(409, "Can only append to a READY dataset")
+    if mode == "append" and not dataset_db_exists(dataset_id):
+        ensure_facts_key()
+    spatial.invalidate(dataset_id)
+    if mode == "replace":
+        if drop_dataset_db(dataset_id):
+            create_dataset_db(dataset_id)
+        else:
+            con = connect(); cur = con.cursor()
+            cur.execute("DELETE FROM facts WHERE dataset_id=?", (dataset_id,))
+            cur.execute("DELETE FROM assets WHERE dataset_id=?", (dataset_id,))
+            con.commit(); con.close()
     con = connect(); cur = con.cursor()
+    if mode == "replace":
+        cur.execute("UPDATE datasets SET summary_json=NULL WHERE id=?", (dataset_id,))
     cur.execute("UPDATE datasets SET mapping_json=?, status=?, error=NULL WHERE id=?", (json.dumps(mapping), "PROCESSING", dataset_id))
     con.commit(); con.close()
-    job_upsert(dataset_id, status="PROCESSING", stage="queued", processed_rows=0, updated_at=_now(), error=None, cancel_requested=0)
-    return {"status":"PROCESSING","dataset_id":dataset_id}
+    total = (_read_meta(dataset_id, required=False).get("profile") or {}).get("estimated_rows")
+    clear_cancel(dataset_id)
+    reset_progress(dataset_id)
+    job_upsert(dataset_id, status="PROCESSING", stage="queued", processed_rows=0, total_rows=total, updated_at=_now(), error=None, cancel_requested=0,
+               mode=mode, file_path=None, rows_added=0, assets_added=0, batch_rows=None, byte_offset=None)
+    return {"status":"PROCESSING","dataset_id":dataset_id,"mode":mode}
+
+@router.post("/datasets/{dataset_id}/append")
+def start_append(dataset_id: str, upload_id: str, mapping: Optional[dict] = None):
+    # ingest an additional file (uploaded with upload/init?dataset_id=...) into a READY dataset
+    ds = get_dataset(dataset_id)
+    if not ds: raise HTTPException(404, "Dataset not found")
+    if ds.get("status") != "READY": raise HTTPException(409, "Can only append to a READY dataset")
+    meta = _read_meta(dataset_id)
+    entry = (meta.get("appends") or {}).get(upload_id)
+    if not entry or not os.path.exists(entry["path"]):
+        raise HTTPException(404, "Append file not found")
+    entry["mapping"] = mapping or entry.get("mapping") or ds.get("mapping") or detect_columns(entry["path"]).get("guess") or {}
+    _write_meta(dataset_id, meta)
+    if not dataset_db_exists(dataset_id):
+        ensure_facts_key()
+    spatial.invalidate(dataset_id)
+    con = connect(); cur = con.cursor()
+    cur.execute("UPDATE datasets SET status=?, error=NULL WHERE id=?", ("PROCESSING", dataset_id))
+    con.commit(); con.close()
+    total = (entry.get("profile") or {}).get("estimated_rows")
+    clear_cancel(dataset_id)
+    reset_progress(dataset_id)
+    job_upsert(dataset_id, status="PROCESSING", stage="queued", processed_rows=0, total_rows=total, updated_at=_now(), error=None, cancel_requested=0,
+               mode="append", file_path=entry["path"], rows_added=0, assets_added=0, batch_rows=None, byte_offset=None)
+    return {"status":"PROCESSING","dataset_id":dataset_id,"mode":"append","upload_id":upload_id}
 
 @router.post("/datasets/{dataset_id}/ingest-step")
 def ingest_step(dataset_id: str, chunk_rows: int = 5000):
     ds = get_dataset(dataset_id)
     if not ds: raise HTTPException(404, "Dataset not found")
 
-    # locate original file
-    ddir = dataset_dir(dataset_id)
-    meta_path = os.path.join(ddir, "meta.json")
-    if not os.path.exists(meta_path):
-        raise HTTPException(404, "Original file not found")
-    meta = json.loads(open(meta_path, "r", encoding="utf-8").read())
-    file_path = meta["original_path"]
+    # locate the file for the current job (original, or an appended file)
+    meta = _read_meta(dataset_id)
+    job = job_get(dataset_id) or {}
+    mode = job.get("mode") or "replace"
+    file_path = job.get("file_path") or meta["original_path"]
 
     mapping = ds.get("mapping") or {}
+    appended = [a for a in (meta.get("appends") or {}).values() if a.get("path") == file_path]
+    if appended and appended[0].get("mapping"):
+        mapping = appended[0]["mapping"]
     if not mapping:
         detected = detect_columns(file_path)
         mapping = detected.get("guess") or {}
@@ -90,41 +160,52 @@ def ingest_step(dataset_id: str, chunk_rows: int = 5000):
         con.commit(); con.close()
 
     if cancel_requested(dataset_id):
-        con = connect(); cur = con.cursor()
-        cur.execute("UPDATE datasets SET status=?, error=? WHERE id=?", ("FAILED", "Cancelled by user", dataset_id))
-        con.commit(); con.close()
-        job_upsert(dataset_id, status="FAILED", stage="cancelled", updated_at=_now(), error="Cancelled by user")
-        return {"ok": True, "status": "FAILED", "error": "Cancelled by user"}
+        return _cancelled(dataset_id, mode)
 
     job_upsert(dataset_id, status="PROCESSING", stage="ingesting", updated_at=_now())
 
-    progress = ingest_step_sqlite(dataset_id, file_path, mapping, chunk_rows=chunk_rows, cancel_cb=lambda: cancel_requested(dataset_id))
+    progress = ingest_step_sqlite(dataset_id, file_path, mapping, chunk_rows=chunk_rows, cancel_cb=lambda: cancel_requested(dataset_id), mode=mode)
 
+    if progress.get("cancelled"):
+        return _cancelled(dataset_id, mode)
     if progress.get("done"):
-        summary = {"row_count": progress.get("row_count"), "asset_count": progress.get("asset_count")}
+        summary = progress.get("summary") or {"row_count": progress.get("row_count"), "asset_count": progress.get("asset_count")}
         con = connect(); cur = con.cursor()
         cur.execute("UPDATE datasets SET status=?, summary_json=?, error=NULL WHERE id=?", ("READY", json.dumps(summary), dataset_id))
         con.commit(); con.close()
-        job_upsert(dataset_id, status="READY", stage="done", processed_rows=progress.get("row_count"), updated_at=_now(), error=None)
-        return {"ok": True, "status": "READY", "summary": summary}
+        spatial.build_async(dataset_id)
+        job_upsert(dataset_id, status="READY", stage="done", processed_rows=progress.get("processed_rows"), total_rows=progress.get("processed_rows"), updated_at=_now(), error=None)
+        return {"ok": True, "status": "READY", "summary": summary, "stats": progress.get("stats")}
     else:
         job_upsert(dataset_id, status="PROCESSING", stage="ingesting", processed_rows=progress.get("processed_rows"), updated_at=_now(), error=None)
         return {"ok": True, "status": "PROCESSING", "progress": progress}
 
+def _cancelled(dataset_id: str, mode: str):
+    # a cancelled append leaves the previously loaded data in place (counts are kept per step)
+    status = "READY" if mode == "append" else "FAILED"
+    con = connect(); cur = con.cursor()
+    cur.execute("UPDATE datasets SET status=?, error=? WHERE id=?", (status, "Cancelled by user", dataset_id))
+    con.commit(); con.close()
+    job_upsert(dataset_id, status="FAILED", stage="cancelled", updated_at=_now(), error="Cancelled by user")
+    return {"ok": True, "status": status, "error": "Cancelled by user"}
+
 @router.get("/datasets/{dataset_id}/detect")
 def detect_for_dataset(dataset_id: str):
-    ddir = dataset_dir(dataset_id)
-    meta_path = os.path.join(ddir, "meta.json")
-    if not os.path.exists(meta_path):
-        raise HTTPException(404, "Original file not found")
-    meta = json.loads(open(meta_path, "r", encoding="utf-8").read())
-    return detect_columns(meta["original_path"])
+    meta = _read_meta(dataset_id)
+    detected = detect_columns(meta["original_path"])
+    if meta.get("profile"):
+        detected["profile"] = meta["profile"]
+    return detected
 
 @router.delete("/datasets/{dataset_id}/hard-delete")
 def hard_delete(dataset_id: str):
+    # per-dataset file: unlink it; shared tables: DELETE the dataset's rows
+    spatial.invalidate(dataset_id)
+    in_file = drop_dataset_db(dataset_id)
     con = connect(); cur = con.cursor()
-    cur.execute("DELETE FROM facts WHERE dataset_id=?", (dataset_id,))
-    cur.execute("DELETE FROM assets WHERE dataset_id=?", (dataset_id,))
+    if not in_file:
+        cur.execute("DELETE FROM facts WHERE dataset_id=?", (dataset_id,))
+        cur.execute("DELETE FROM assets WHERE dataset_id=?", (dataset_id,))
     cur.execute("DELETE FROM ingest_jobs WHERE dataset_id=?", (dataset_id,))
     cur.execute("DELETE FROM datasets WHERE id=?", (dataset_id,))
     con.commit(); con.close()
@@ -1,13 +1,8 @@
 import io, json, datetime
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
 
-from .db import connect
+from .db import connect_dataset
 
 router = APIRouter()
 
@@ -26,7 +21,15 @@ def _fetch_asset_rows(con, dataset_id: str, asset_id: str, filters: dict):
     cur.execute(sql, params)
     return [dict(r) for r in cur.fetchall()]
 
+# matplotlib and reportlab are imported on first use so they stay out of app startup.
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
 def _radar_png(rows):
+    plt = _pyplot()
     by = {}
     for r in rows:
         ind = r.get("indicator") or "Unknown"
@@ -66,12 +69,14 @@ def preview(payload: dict):
     if rtype == "asset" and not asset_id:
         raise HTTPException(400, "asset_id required for asset report")
 
-    con = connect()
+    con = connect_dataset(dataset_id)
     rows = _fetch_asset_rows(con, dataset_id, asset_id, filters)
     con.close()
 
     radar = _radar_png(rows)
 
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
     pdf = io.BytesIO()
     c = canvas.Canvas(pdf, pagesize=A4)
     w, h = A4
@@ -111,7 +116,7 @@ def preview_portfolio(payload: dict):
     if not dataset_id:
         raise HTTPException(400, "dataset_id required")
 
-    con = connect(); cur = con.cursor()
+    con = connect_dataset(dataset_id); cur = con.cursor()
     sql = "SELECT asset_id, MAX(value) AS score FROM facts WHERE dataset_id=?"
     params = [dataset_id]
     for k, col in [("years","year"), ("scenarios","scenario"), ("themes","theme"), ("indicators","indicator")]:
@@ -125,6 +130,8 @@ def preview_portfolio(payload: dict):
     top_rows = [dict(r) for r in cur.fetchall()]
     con.close()
 
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
     pdf = io.BytesIO()
     c = canvas.Canvas(pdf, pagesize=A4)
     w, h = A4
@@ -1,9 +1,10 @@
 import os, json, uuid, datetime, shutil
+from typing import Optional
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import FileResponse
 from .storage import chunks_dir, dataset_dir
-from .db import connect
-from .ingest import detect_columns
+from .db import connect, create_dataset_db, dataset_db_files_enabled
+from .ingest import detect_columns, profile_csv
 from .jobs import job_upsert
 
 router = APIRouter()
@@ -11,16 +12,33 @@ router = APIRouter()
 def _now():
     return datetime.datetime.utcnow().isoformat() + "Z"
 
+def _append_marker(upload_id: str):
+    # written at upload/init when the upload is an additional file for an existing dataset
+    return os.path.join(chunks_dir(upload_id), "append")
+
 @router.post("/upload/init")
-def upload_init(filename: str = Form(...), size_bytes: int = Form(0)):
+def upload_init(filename: str = Form(...), size_bytes: int = Form(0), dataset_id: Optional[str] = Form(None)):
+    # dataset_id given -> the file will be appended to that existing dataset
     upload_id = str(uuid.uuid4())
-    dataset_id = str(uuid.uuid4())
     con = connect(); cur = con.cursor()
+    if dataset_id:
+        cur.execute("SELECT status FROM datasets WHERE id=?", (dataset_id,))
+        row = cur.fetchone()
+        con.close()
+        if not row: raise HTTPException(404, "Dataset not found")
+        if row["status"] != "READY": raise HTTPException(409, "Can only append to a READY dataset")
+        # finalize branches on this, not on the dataset's status by then
+        with open(_append_marker(upload_id), "w", encoding="utf-8") as f:
+            f.write(dataset_id)
+        return {"upload_id": upload_id, "dataset_id": dataset_id, "append": True}
+    dataset_id = str(uuid.uuid4())
     cur.execute(
         "INSERT INTO datasets(id,name,status,summary_json,mapping_json,error,created_at) VALUES (?,?,?,?,?,?,?)",
         (dataset_id, filename, "UPLOADING", None, None, None, _now())
     )
     con.commit(); con.close()
+    if dataset_db_files_enabled():
+        create_dataset_db(dataset_id)
     return {"upload_id": upload_id, "dataset_id": dataset_id}
 
 @router.post("/upload/chunk")
@@ -48,6 +66,13 @@ def upload_finalize(
         raise HTTPException(400, "No parts uploaded")
 
     ext = os.path.splitext(filename)[1].lower()
+    marker = _append_marker(upload_id)
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as f:
+            if f.read() != dataset_id:
+                raise HTTPException(400, "upload_id was initialised for a different dataset")
+        return _finalize_append(upload_id, dataset_id, filename, ext, d, parts)
+
     out_dir = dataset_dir(dataset_id)
     original_path = os.path.join(out_dir, f"original{ext or ''}")
 
@@ -56,21 +81,47 @@ def upload_finalize(
             with open(os.path.join(d, p), "rb") as f:
                 shutil.copyfileobj(f, out)
 
-    meta = {"original_path": original_path, "original_name": filename}
+    detected = _detect(original_path)
+
+    meta = {"original_path": original_path, "original_name": filename, "profile": detected.get("profile")}
     with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
         json.dump(meta, f)
 
-    detected = detect_columns(original_path)
-
     con = connect(); cur = con.cursor()
     cur.execute("UPDATE datasets SET status=? WHERE id=?", ("UPLOADED", dataset_id))
     con.commit(); con.close()
 
-    job_upsert(dataset_id, status="UPLOADED", stage="uploaded", processed_rows=0, total_rows=None, updated_at=_now(), error=None, cancel_requested=0)
+    total = (detected.get("profile") or {}).get("estimated_rows")
+    job_upsert(dataset_id, status="UPLOADED", stage="uploaded", processed_rows=0, total_rows=total, updated_at=_now(), error=None, cancel_requested=0)
 
     shutil.rmtree(d, ignore_errors=True)
     return {"status": "UPLOADED", "dataset_id": dataset_id, "detected": detected}
 
+def _detect(path: str):
+    # header-based mapping guess plus a sampled type/quality profile (CSV only)
+    detected = detect_columns(path)
+    if path.lower().endswith(".csv"):
+        detected["profile"] = profile_csv(path, detected.get("guess"))
+    return detected
+
+def _finalize_append(upload_id: str, dataset_id: str, filename: str, ext: str, d: str, parts):
+    out_dir = dataset_dir(dataset_id)
+    path = os.path.join(out_dir, f"append_{upload_id}{ext or ''}")
+    with open(path, "wb") as out:
+        for p in parts:
+            with open(os.path.join(d, p), "rb") as f:
+                shutil.copyfileobj(f, out)
+
+    detected = _detect(path)
+
+    meta_path = os.path.join(out_dir, "meta.json")
+    meta = json.loads(open(meta_path, "r", encoding="utf-8").read()) if os.path.exists(meta_path) else {}
+    meta.setdefault("appends", {})[upload_id] = {"path": path, "name": filename, "uploaded_at": _now(), "profile": detected.get("profile")}
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    shutil.rmtree(d, ignore_errors=True)
+    return {"status": "UPLOADED", "dataset_id": dataset_id, "upload_id": upload_id, "append": True, "detected": detected}
+
 @router.get("/datasets/{dataset_id}/original")
 def download_original(dataset_id: str):
     out_dir = dataset_dir(dataset_id)
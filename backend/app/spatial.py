@@ -0,0 +1,212 @@
+import os, math, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .db import connect_dataset
+
+# In-memory nearest-neighbour index over a dataset's assets.
+#
+# A KD-tree over the assets' 3D unit vectors: straight-line (chord) distance
+# between unit vectors is monotonic in great-circle distance, so a euclidean
+# tree gives exact haversine neighbours with no special cases at the
+# antimeridian or poles. Leaves are contiguous slices of the reordered points
+# and are scanned with numpy, which keeps queries well under a millisecond on
+# ~1M assets without a scipy/sklearn dependency. numpy is imported lazily to
+# keep it out of startup.
+#
+# Only the points and the assets' SQLite rowids are held in memory (about
+# 32 bytes per asset); asset_id/label/lat/lon are read back for the k hits.
+# The cache is bounded by the indexes' total size, not by their number.
+
+EARTH_KM = 6371.0088
+LEAF_SIZE = 64
+ASSET_INDEX_CACHE_MB = float(os.getenv("ASSET_INDEX_CACHE_MB", "128"))
+
+def _km_to_chord(km: float) -> float:
+    return 2.0 * math.sin(min(math.pi, km / EARTH_KM) / 2.0)
+
+def _chord_to_km(c: float) -> float:
+    return 2.0 * EARTH_KM * math.asin(min(1.0, c / 2.0))
+
+class AssetIndex:
+    def __init__(self, dataset_id, rowids, lat, lon):
+        import numpy as np
+        self.np = np
+        self.dataset_id = dataset_id
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        self.size = len(lat)
+        rlat, rlon = np.radians(lat), np.radians(lon)
+        pts = np.column_stack([np.cos(rlat) * np.cos(rlon), np.cos(rlat) * np.sin(rlon), np.sin(rlat)])
+        del lat, lon, rlat, rlon
+
+        # nodes: parallel arrays; leaves have dim == -1 and cover perm[lo:hi]
+        lo_, hi_, dim_, split_, left_, right_ = [], [], [], [], [], []
+        perm = np.arange(self.size)
+        stack = [(0, self.size, None, None)]  # (lo, hi, parent, is_right)
+        while stack:
+            lo, hi, parent, is_right = stack.pop()
+            node = len(lo_)
+            lo_.append(lo); hi_.append(hi)
+            dim_.append(-1); split_.append(0.0); left_.append(-1); right_.append(-1)
+            if parent is not None:
+                (right_ if is_right else left_)[parent] = node
+            if hi - lo <= LEAF_SIZE:
+                continue
+            sub = perm[lo:hi]
+            p = pts[sub]
+            dim = int(np.argmax(p.max(axis=0) - p.min(axis=0)))
+            mid = (lo + hi) // 2
+            part = np.argpartition(p[:, dim], mid - lo)
+            perm[lo:hi] = sub[part]
+            dim_[node] = dim
+            split_[node] = float(pts[perm[mid], dim])
+            stack.append((mid, hi, node, True))
+            stack.append((lo, mid, node, False))
+
+        self.lo, self.hi = np.array(lo_, dtype=np.int64), np.array(hi_, dtype=np.int64)
+        self.dim = np.array(dim_, dtype=np.int8)
+        self.split = np.array(split_, dtype=np.float64)
+        self.left, self.right = np.array(left_, dtype=np.int32), np.array(right_, dtype=np.int32)
+        self.pts = pts[perm]
+        self.rowids = np.asarray(rowids, dtype=np.int64)[perm]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.pts, self.rowids, self.lo, self.hi, self.dim, self.split, self.left, self.right))
+
+    def query(self, lat: float, lon: float, k: int = 10, radius_km=None, con=None):
+        # con: an open connection to the dataset's DB to read the hits' rows through (else one is opened)
+        np = self.np
+        if not self.size:
+            return []
+        k = max(1, int(k))
+        rlat, rlon = math.radians(lat), math.radians(lon)
+        q = (math.cos(rlat) * math.cos(rlon), math.cos(rlat) * math.sin(rlon), math.sin(rlat))
+        qv = np.array(q)
+        bound = _km_to_chord(radius_km) ** 2 if radius_km is not None else float("inf")
+        best_idx, best_d = np.empty(0, dtype=np.int64), np.empty(0)
+        worst = bound
+
+        stack = [(0, 0.0)]  # (node, squared distance from q to the node's side of its parent split)
+        while stack:
+            node, plane = stack.pop()
+            if plane > worst:
+                continue
+            dim = int(self.dim[node])
+            if dim < 0:
+                lo, hi = int(self.lo[node]), int(self.hi[node])
+                diff = self.pts[lo:hi] - qv
+                d = np.einsum("ij,ij->i", diff, diff)
+                keep = d <= worst
+                if not keep.any():
+                    continue
+                best_idx = np.concatenate([best_idx, np.arange(lo, hi)[keep]])
+                best_d = np.concatenate([best_d, d[keep]])
+                if len(best_d) > k:
+                    part = np.argpartition(best_d, k - 1)[:k]
+                    best_idx, best_d = best_idx[part], best_d[part]
+                if len(best_d) >= k:
+                    worst = min(bound, float(best_d.max()))
+                continue
+            delta = q[dim] - float(self.split[node])
+            near, far = (int(self.left[node]), int(self.right[node])) if delta < 0 else (int(self.right[node]), int(self.left[node]))
+            # far side is only visited if the splitting plane is closer than the k-th hit so far
+            stack.append((far, max(plane, delta * delta)))
+            stack.append((near, plane))
+
+        order = np.argsort(best_d, kind="stable")
+        hits = list(zip(self.rowids[best_idx[order]].tolist(), best_d[order].tolist()))
+        if not hits:
+            return []
+        own = con is None
+        if own:
+            con = connect_dataset(self.dataset_id)
+        cur = con.cursor()
+        cur.row_factory = None
+        cur.execute(f"SELECT rowid, asset_id, label, latitude, longitude FROM assets WHERE rowid IN ({','.join('?' * len(hits))})",
+                    [r for r, _ in hits])
+        found = {r[0]: r[1:] for r in cur.fetchall()}
+        if own:
+            con.close()
+        out = []
+        for rowid, dist in hits:
+            a = found.get(rowid)
+            if a is None:  # deleted since the build; invalidate() will drop this index
+                continue
+            out.append({"asset_id": a[0], "label": a[1], "latitude": a[2], "longitude": a[3],
+                        "distance_km": round(_chord_to_km(math.sqrt(dist)), 3)})
+        return out
+
+def build_index(dataset_id: str) -> AssetIndex:
+    import numpy as np
+    con = connect_dataset(dataset_id); cur = con.cursor()
+    cur.row_factory = None
+    cur.execute("SELECT rowid, latitude, longitude FROM assets WHERE dataset_id=? AND latitude IS NOT NULL AND longitude IS NOT NULL", (dataset_id,))
+    # straight into a packed array, without an intermediate list of row tuples
+    data = np.fromiter(cur, dtype=[("rowid", np.int64), ("lat", np.float64), ("lon", np.float64)])
+    con.close()
+    return AssetIndex(dataset_id, data["rowid"], data["lat"], data["lon"])
+
+_cache = OrderedDict()  # dataset_id -> AssetIndex, least recently used first
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+_generation = {}  # dataset_id -> bumped on invalidate, so a build racing a data change isn't cached
+
+_inflight = {}  # dataset_id -> Future of the build in progress; concurrent misses wait on it
+
+def get_index(dataset_id: str) -> AssetIndex:
+    # callers check the dataset exists first; this never decides that on its own
+    global _cache_bytes
+    with _cache_lock:
+        idx = _cache.get(dataset_id)
+        if idx is not None:
+            _cache.move_to_end(dataset_id)
+            return idx
+        fut = _inflight.get(dataset_id)
+        if fut is None:
+            fut = _inflight[dataset_id] = Future()
+            gen = _generation.get(dataset_id, 0)
+            building = True
+        else:
+            building = False
+    if not building:
+        return fut.result()
+    try:
+        idx = build_index(dataset_id)
+    except BaseException as e:
+        with _cache_lock:
+            if _inflight.get(dataset_id) is fut:
+                del _inflight[dataset_id]
+        fut.set_exception(e)
+        raise
+    with _cache_lock:
+        if _inflight.get(dataset_id) is fut:
+            del _inflight[dataset_id]
+        budget = ASSET_INDEX_CACHE_MB * 1048576
+        # not cached if the data changed during the build, or it's too big to keep (rebuilt on the next miss)
+        if _generation.get(dataset_id, 0) == gen and idx.nbytes <= budget:
+            old = _cache.pop(dataset_id, None)
+            if old is not None:
+                _cache_bytes -= old.nbytes
+            _cache[dataset_id] = idx
+            _cache_bytes += idx.nbytes
+            while _cache_bytes > budget:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= evicted.nbytes
+    fut.set_result(idx)
+    return idx
+
+def invalidate(dataset_id: str):
+    global _cache_bytes
+    with _cache_lock:
+        old = _cache.pop(dataset_id, None)
+        if old is not None:
+            _cache_bytes -= old.nbytes
+        _generation[dataset_id] = _generation.get(dataset_id, 0) + 1
+        _inflight.pop(dataset_id, None)  # later callers start a fresh build instead of waiting on a stale one
+
+def build_async(dataset_id: str):
+    # called when a dataset becomes READY so the first "near" query doesn't pay for the build
+    invalidate(dataset_id)
+    threading.Thread(target=get_index, args=(dataset_id,), name=f"asset-index-{dataset_id}", daemon=True).start()
@@ -1,5 +1,5 @@
 import os
-from .db import data_dir
+from .db import data_dir, check_dataset_id
 
 def datasets_root():
     d = os.path.join(data_dir(), "datasets")
@@ -7,7 +7,7 @@ def datasets_root():
     return d
 
 def dataset_dir(dataset_id: str):
-    d = os.path.join(datasets_root(), dataset_id)
+    d = os.path.join(datasets_root(), check_dataset_id(dataset_id))
     os.makedirs(d, exist_ok=True)
     return d
 
@@ -0,0 +1,42 @@
+import sys, json, argparse
+
+# Compare two bench.run JSON files scenario by scenario (matched on row count).
+
+def _index(doc):
+    return {run["rows"]: run["results"] for run in doc.get("runs", [])}
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    p.add_argument("base")
+    p.add_argument("head")
+    p.add_argument("--threshold", type=float, default=0.10, help="flag slowdowns above this fraction")
+    a = p.parse_args(argv)
+    base = json.load(open(a.base, "r", encoding="utf-8"))
+    head = json.load(open(a.head, "r", encoding="utf-8"))
+    print(f"base {base['meta'].get('git_rev')}  ->  head {head['meta'].get('git_rev')}")
+    regressions = 0
+    bs_, hs_ = base.get("startup") or {}, head.get("startup") or {}
+    for k in ("import_seconds", "first_health_seconds"):
+        if k in bs_ and k in hs_:
+            delta = (hs_[k] - bs_[k]) / bs_[k] if bs_[k] else 0.0
+            flag = ""
+            if delta > a.threshold:
+                flag = "  <-- slower"; regressions += 1
+            print(f"  startup.{k:22s} {bs_[k]:8.3f}s {hs_[k]:8.3f}s {delta:+8.1%}{flag}")
+    bi, hi = _index(base), _index(head)
+    for rows in sorted(set(bi) & set(hi)):
+        print(f"\n{rows} rows")
+        for name, h in hi[rows].items():
+            b = bi[rows].get(name)
+            if not isinstance(h, dict) or not isinstance(b, dict) or "seconds" not in h or "seconds" not in b:
+                continue
+            bs, hs = b["seconds"], h["seconds"]
+            delta = (hs - bs) / bs if bs else 0.0
+            flag = ""
+            if delta > a.threshold:
+                flag = "  <-- slower"; regressions += 1
+            print(f"  {name:20s} {bs:10.3f}s {hs:10.3f}s {delta:+8.1%}{flag}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import os, io, sys, json, time, shutil, asyncio, argparse, platform, sqlite3, subprocess, tempfile, datetime
+
+from . import synth, startup
+
+# Benchmarks drive the route functions in-process (no HTTP server), so the
+# numbers reflect query/ingest cost rather than network or uvicorn overhead.
+
+def _now():
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+def _git_rev():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+class Timer:
+    # soft=True records the error and carries on (optional scenarios); otherwise it propagates
+    def __init__(self, results: dict, name: str, soft: bool = False):
+        self.results = results; self.name = name; self.soft = soft; self.extra = {}
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+    def __exit__(self, exc_type, exc, tb):
+        entry = {"seconds": round(time.perf_counter() - self.t0, 4)}
+        entry.update(self.extra)
+        if exc is not None:
+            entry["error"] = f"{exc_type.__name__}: {exc}"
+        self.results[self.name] = entry
+        return self.soft and exc is not None and not isinstance(exc, KeyboardInterrupt)
+
+def _drain(resp) -> int:
+    # StreamingResponse wraps sync generators in an async iterator
+    async def go():
+        n = 0
+        async for b in resp.body_iterator:
+            n += len(b if isinstance(b, (bytes, bytearray)) else b.encode("utf-8"))
+        return n
+    return asyncio.run(go())
+
+def scenario_upload(results, csv_path: str, chunk_mb: int):
+    from fastapi import UploadFile
+    from app.routes_upload import upload_init, upload_chunk, upload_finalize
+    name = os.path.basename(csv_path)
+    size = os.path.getsize(csv_path)
+    with Timer(results, "upload") as t:
+        init = upload_init(filename=name, size_bytes=size, dataset_id=None)
+        part = 0
+        with open(csv_path, "rb") as f:
+            while True:
+                buf = f.read(chunk_mb * 1024 * 1024)
+                if not buf: break
+                part += 1
+                upload_chunk(upload_id=init["upload_id"], dataset_id=init["dataset_id"], part_number=part,
+                             chunk=UploadFile(file=io.BytesIO(buf), filename=name))
+        t.extra["parts"] = part
+        t.extra["bytes"] = size
+    with Timer(results, "finalize") as t:
+        fin = upload_finalize(upload_id=init["upload_id"], dataset_id=init["dataset_id"], filename=name)
+        t.extra["estimated_rows"] = (fin["detected"].get("profile") or {}).get("estimated_rows")
+    if results["upload"]["seconds"]:
+        results["upload"]["mb_per_sec"] = round(size / 1048576 / results["upload"]["seconds"], 2)
+    return init["dataset_id"], fin["detected"]["guess"]
+
+def scenario_ingest(results, dataset_id: str, mapping: dict, chunk_rows: int):
+    from app.routes_datasets import start_ingest, ingest_step
+    start_ingest(dataset_id, mapping, mode="replace")
+    steps = []
+    with Timer(results, "ingest") as t:
+        while True:
+            res = ingest_step(dataset_id, chunk_rows=chunk_rows)
+            steps.append(res.get("stats") or (res.get("progress") or {}).get("stats") or {})
+            if res.get("status") != "PROCESSING":
+                break
+        t.extra["steps"] = len(steps)
+        t.extra["step_peak_rss_mb"] = max((st.get("step_peak_rss_mb") or 0) for st in steps)
+        t.extra["process_peak_rss_mb"] = max((st.get("process_peak_rss_mb") or 0) for st in steps)
+        t.extra["batch_rows_final"] = steps[-1].get("batch_rows")
+        t.extra["step_rows_per_sec_min"] = min((st.get("rows_per_sec") or 0) for st in steps)
+        t.extra["status"] = res.get("status")
+        t.extra["summary"] = res.get("summary")
+    rows = (res.get("summary") or {}).get("row_count") or 0
+    if rows and results["ingest"]["seconds"]:
+        results["ingest"]["rows_per_sec"] = round(rows / results["ingest"]["seconds"], 1)
+
+def scenario_queries(results, dataset_id: str, pages: int, page_size: int):
+    from app.routes_analytics import filter_options, facts, top_assets, export_csv
+    with Timer(results, "filter_options") as t:
+        opts = filter_options(dataset_id)
+        t.extra["counts"] = {k: len(v) for k, v in opts.items()}
+
+    with Timer(results, "facts_paging") as t:
+        n = 0
+        for p in range(pages):
+            res = facts(dataset_id, assets=None, years=None, scenarios=None, themes=None, indicators=None,
+                        limit=page_size, offset=p * page_size, fmt="json")
+            n += len(res["rows"])
+            if len(res["rows"]) < page_size: break
+        t.extra["rows"] = n
+
+    with Timer(results, "facts_paging_columns") as t:
+        n = 0
+        for p in range(pages):
+            resp = facts(dataset_id, assets=None, years=None, scenarios=None, themes=None, indicators=None,
+                         limit=page_size, offset=p * page_size, fmt="columns")
+            n += len(resp.body)
+        t.extra["bytes"] = n
+
+    filt = dict(years=opts["years"][-1:] or None, scenarios=opts["scenarios"][-1:] or None,
+                themes=None, indicators=None)
+    with Timer(results, "facts_filtered") as t:
+        res = facts(dataset_id, assets=None, limit=page_size, offset=0, fmt="json", **filt)
+        t.extra["rows"] = len(res["rows"])
+
+    with Timer(results, "top_assets") as t:
+        top = top_assets(dataset_id, top_n=20, fmt="json", **filt)
+        t.extra["rows"] = len(top)
+
+    from app.spatial import get_index
+    from app.routes_analytics import assets_near
+    with Timer(results, "asset_index_build") as t:
+        t.extra["assets"] = get_index(dataset_id).size
+    with Timer(results, "assets_near") as t:
+        n = 100
+        for i in range(n):
+            assets_near(dataset_id, lat=-40.0 + i, lon=-170.0 + 3.4 * i, k=10, radius_km=None, years=None,
+                        scenarios=None, themes=None, indicators=None, fmt="json")
+        t.extra["queries"] = n
+
+    with Timer(results, "export_csv") as t:
+        resp = export_csv(dataset_id, assets=None, **filt)
+        t.extra["bytes"] = _drain(resp)
+
+    return top[0]["asset_id"] if top else None
+
+def scenario_report(results, dataset_id: str, asset_id: str):
+    with Timer(results, "report_preview", soft=True) as t:
+        from app.routes_reports import preview
+        resp = preview({"dataset_id": dataset_id, "type": "asset", "asset_id": asset_id, "filters": {}})
+        t.extra["bytes"] = _drain(resp)
+
+def scenario_delete(results, dataset_id: str):
+    from app.routes_datasets import hard_delete
+    with Timer(results, "hard_delete"):
+        hard_delete(dataset_id)
+
+def _dir_bytes(path: str) -> int:
+    # sqlite files only (app.sqlite and per-dataset data.sqlite, with WAL files)
+    n = 0
+    for root, _, files in os.walk(path):
+        n += sum(os.path.getsize(os.path.join(root, f)) for f in files if ".sqlite" in f)
+    return n
+
+def run_size(rows: int, args) -> dict:
+    cache = os.path.abspath(args.cache_dir)
+    os.makedirs(cache, exist_ok=True)
+    g = synth.grid_for_rows(rows, args.scenarios, args.years, args.themes, args.indicators)
+    csv_path = os.path.join(cache, f"synth_{synth.row_count(g)}_{args.scenarios}x{args.years}x{args.themes}x{args.indicators}_s{args.seed}.csv")
+    results = {}
+    if not os.path.exists(csv_path):
+        with Timer(results, "generate") as t:
+            t.extra["rows"] = synth.write_csv(csv_path, g, seed=args.seed)
+
+    data_dir = tempfile.mkdtemp(prefix="climbench_", dir=args.data_dir)
+    os.environ["DATA_DIR"] = data_dir
+    try:
+        from app.db import init_db
+        init_db()
+        dataset_id, mapping = scenario_upload(results, csv_path, args.chunk_mb)
+        scenario_ingest(results, dataset_id, mapping, args.chunk_rows)
+        asset_id = scenario_queries(results, dataset_id, args.pages, args.page_size)
+        if not args.skip_report and asset_id:
+            scenario_report(results, dataset_id, asset_id)
+        results["db_bytes"] = _dir_bytes(data_dir)
+        scenario_delete(results, dataset_id)
+        results["db_bytes_after_delete"] = _dir_bytes(data_dir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    return {"rows": synth.row_count(g), "grid": g, "csv_bytes": os.path.getsize(csv_path), "results": results}
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Run the ingest/query benchmark suite and write results as JSON.")
+    p.add_argument("--rows", type=int, nargs="+", default=[100_000], help="target sizes, e.g. 100000 1000000 50000000")
+    p.add_argument("--scenarios", type=int, default=3)
+    p.add_argument("--years", type=int, default=4)
+    p.add_argument("--themes", type=int, default=3)
+    p.add_argument("--indicators", type=int, default=10)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--chunk-mb", type=int, default=8)
+    p.add_argument("--chunk-rows", type=int, default=50_000)
+    p.add_argument("--pages", type=int, default=10)
+    p.add_argument("--page-size", type=int, default=5000)
+    p.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "climbench_cache"))
+    p.add_argument("--data-dir", default=None, help="parent directory for the throwaway DATA_DIR")
+    p.add_argument("--dataset-db-files", action="store_true", help="store each dataset in its own SQLite file")
+    p.add_argument("--skip-report", action="store_true")
+    p.add_argument("--skip-startup", action="store_true", help="skip the cold-start (import / first health) measurement")
+    p.add_argument("--keep", action="store_true", help="keep the benchmark DATA_DIR")
+    p.add_argument("--out", default=None, help="JSON output path (default: bench_results/<rev>_<ts>.json)")
+    args = p.parse_args(argv)
+    if args.dataset_db_files:
+        os.environ["DATASET_DB_FILES"] = "1"
+
+    out = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "created_at": _now(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "runs": [],
+    }
+    if not args.skip_startup:
+        print("[bench] startup ...", file=sys.stderr)
+        with Timer(out, "startup", soft=True) as t:
+            t.extra.update(startup.run())
+        print(f"  import {out['startup'].get('import_seconds')}s  first health {out['startup'].get('first_health_seconds')}s", file=sys.stderr)
+    for rows in args.rows:
+        print(f"[bench] {rows} rows ...", file=sys.stderr)
+        run = run_size(rows, args)
+        out["runs"].append(run)
+        for k, v in run["results"].items():
+            if isinstance(v, dict):
+                print(f"  {k:20s} {v.get('seconds', 0):10.3f}s" + (f"  {v['error']}" if "error" in v else ""), file=sys.stderr)
+
+    path = args.out
+    if not path:
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        path = os.path.join("bench_results", f"{out['meta']['git_rev'] or 'nogit'}_{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
+    print(f"[bench] wrote {path}", file=sys.stderr)
+    return out
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os, sys, json, time, shutil, socket, argparse, statistics, subprocess, tempfile, urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("pandas", "matplotlib", "reportlab")
+
+# Each measurement runs in a fresh interpreter so nothing is already imported.
+_IMPORT_SNIPPET = """
+import sys, time, json
+t = time.perf_counter()
+import app.main
+dt = time.perf_counter() - t
+print(json.dumps({"seconds": dt, "heavy_loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY,)
+
+def _env(data_dir: str):
+    env = dict(os.environ)
+    env["DATA_DIR"] = data_dir
+    env.pop("WARMUP", None)
+    return env
+
+def measure_import(data_dir: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET], cwd=BACKEND, env=_env(data_dir),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_first_health(data_dir: str, timeout: float = 60.0) -> float:
+    # process spawn -> first 200 from /api/health, i.e. what a cold Render instance pays
+    port = _free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+                            cwd=BACKEND, env=_env(data_dir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("server did not answer /api/health")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def run(repeat: int = 3) -> dict:
+    data_dir = tempfile.mkdtemp(prefix="climbench_startup_")
+    try:
+        imports = [measure_import(data_dir) for _ in range(repeat)]
+        health = [measure_first_health(data_dir) for _ in range(repeat)]
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return {
+        "import_seconds": round(statistics.median(i["seconds"] for i in imports), 4),
+        "first_health_seconds": round(statistics.median(health), 4),
+        "heavy_loaded_at_import": imports[-1]["heavy_loaded"],
+        "repeat": repeat,
+    }
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Measure app import time and time to first /api/health.")
+    p.add_argument("--repeat", type=int, default=3)
+    a = p.parse_args(argv)
+    print(json.dumps(run(a.repeat), indent=2))
+
+if __name__ == "__main__":
+    main()
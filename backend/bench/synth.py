@@ -0,0 +1,77 @@
+import os, csv, random, argparse
+
+# Header names chosen so detect_columns() guesses every mapping field.
+HEADER = ["asset_id", "label", "latitude", "longitude", "year", "scenario", "theme", "indicator", "Score", "units"]
+
+SCENARIOS = ["SSP1-2.6", "SSP2-4.5", "SSP3-7.0", "SSP5-8.5"]
+THEMES = ["Score", "Data", "Change"]
+INDICATORS = [
+    "Extreme Heat", "Riverine Flood", "Coastal Flood", "Drought", "Tropical Cyclone",
+    "Wildfire", "Extreme Wind", "Extreme Rainfall", "Sea Level Rise", "Landslide",
+    "Hail", "Cold Wave", "Subsidence", "Water Stress", "Heat Stress",
+]
+UNITS = {"Score": "index", "Data": "days", "Change": "%"}
+
+def grid(assets=1000, scenarios=3, years=4, themes=3, indicators=10, start_year=2030, year_step=10):
+    return {
+        "assets": assets,
+        "scenarios": SCENARIOS[:scenarios] if scenarios <= len(SCENARIOS) else [f"SSP{i}" for i in range(scenarios)],
+        "years": [start_year + i * year_step for i in range(years)],
+        "themes": THEMES[:themes] if themes <= len(THEMES) else [f"Theme {i}" for i in range(themes)],
+        "indicators": INDICATORS[:indicators] if indicators <= len(INDICATORS) else [f"Indicator {i}" for i in range(indicators)],
+    }
+
+def grid_for_rows(rows: int, scenarios=3, years=4, themes=3, indicators=10):
+    # keep the dimension mix fixed and scale the asset count to hit the target
+    per_asset = scenarios * years * themes * indicators
+    return grid(assets=max(1, rows // per_asset), scenarios=scenarios, years=years, themes=themes, indicators=indicators)
+
+def row_count(g) -> int:
+    return g["assets"] * len(g["scenarios"]) * len(g["years"]) * len(g["themes"]) * len(g["indicators"])
+
+def iter_rows(g, seed: int = 42, asset_offset: int = 0):
+    rnd = random.Random(seed)
+    for a in range(asset_offset, asset_offset + g["assets"]):
+        aid = f"A{a:08d}"
+        label = f"Site {a}"
+        lat = round(rnd.uniform(-45.0, 60.0), 5)
+        lon = round(rnd.uniform(-180.0, 180.0), 5)
+        base = rnd.random()
+        for scen_i, scen in enumerate(g["scenarios"]):
+            for year_i, year in enumerate(g["years"]):
+                for theme in g["themes"]:
+                    for ind in g["indicators"]:
+                        v = base * 50 + scen_i * 5 + year_i * 3 + rnd.random() * 10
+                        yield [aid, label, lat, lon, year, scen, theme, ind, round(v, 3), UNITS.get(theme, "")]
+
+def write_csv(path: str, g, seed: int = 42, asset_offset: int = 0) -> int:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    n = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        for r in iter_rows(g, seed=seed, asset_offset=asset_offset):
+            w.writerow(r)
+            n += 1
+    return n
+
+def main():
+    p = argparse.ArgumentParser(description="Write a synthetic climate-risk CSV.")
+    p.add_argument("out")
+    p.add_argument("--rows", type=int, default=None, help="target row count (overrides --assets)")
+    p.add_argument("--assets", type=int, default=1000)
+    p.add_argument("--scenarios", type=int, default=3)
+    p.add_argument("--years", type=int, default=4)
+    p.add_argument("--themes", type=int, default=3)
+    p.add_argument("--indicators", type=int, default=10)
+    p.add_argument("--seed", type=int, default=42)
+    a = p.parse_args()
+    if a.rows:
+        g = grid_for_rows(a.rows, a.scenarios, a.years, a.themes, a.indicators)
+    else:
+        g = grid(a.assets, a.scenarios, a.years, a.themes, a.indicators)
+    n = write_csv(a.out, g, seed=a.seed)
+    print(f"wrote {n} rows to {a.out}")
+
+if __name__ == "__main__":
+    main()
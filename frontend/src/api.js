@@ -55,3 +55,10 @@ export async function cancelIngest(dataset_id) { return jsonFetch(`/datasets/${d
 export async function renameDataset(dataset_id, name) { return jsonFetch(`/datasets/${dataset_id}/rename?name=${encodeURIComponent(name)}`, { method:'POST' }); }
 export async function hardDeleteDataset(dataset_id) { return jsonFetch(`/datasets/${dataset_id}/hard-delete`, { method:'DELETE' }); }
 export function originalDownloadUrl(dataset_id) { return API_BASE + `/datasets/${dataset_id}/original`; }
+
+export async function assetsNear(dataset_id, lat, lon, { k = 10, radius_km, filters = {} } = {}) {
+  const qs = new URLSearchParams({ lat: String(lat), lon: String(lon), k: String(k) });
+  if (radius_km != null) qs.append('radius_km', String(radius_km));
+  for (const [key, vals] of Object.entries(filters)) (vals || []).forEach(v => qs.append(key, String(v)));
+  return jsonFetch(`/datasets/${dataset_id}/assets/near?${qs}`);
+}